@@ -0,0 +1,61 @@
+"""
+cache.py — in-process semantic response cache for oai.py.
+
+Near-duplicate questions asked in the same conversation context are answered
+from memory instead of the model. Queries are embedded via the embeddings API;
+a hit needs cosine similarity >= threshold AND an identical context hash
+(system prompt, effort, conversation state), so "what about the second one?"
+in a different context never matches.
+"""
+
+import json, math, hashlib
+from collections import deque
+from typing import Optional
+
+from openai import AsyncOpenAI
+
+DEFAULT_EMBED_MODEL = "text-embedding-3-small"
+
+
+def context_hash(*parts) -> str:
+    """SHA-256 of the JSON-serialized conversation context."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class SemanticCache:
+    """Bounded (FIFO) list of (unit embedding, context hash, answer)."""
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        model: str = DEFAULT_EMBED_MODEL,
+        threshold: float = 0.92,
+        max_entries: int = 256,
+    ):
+        self.client = client
+        self.model = model
+        self.threshold = threshold
+        self.entries: deque[tuple[list[float], str, str]] = deque(maxlen=max_entries)
+
+    async def embed(self, text: str) -> Optional[list[float]]:
+        """L2-normalized embedding of text, or None if the API call fails."""
+        try:
+            vec = (await self.client.embeddings.create(model=self.model, input=text)).data[0].embedding
+        except Exception:
+            return None
+        norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+        return [x / norm for x in vec]
+
+    def lookup(self, emb: list[float], ctx: str) -> Optional[str]:
+        """Best cached answer for emb in context ctx, if similar enough."""
+        best, best_score = None, self.threshold
+        for vec, entry_ctx, text in self.entries:
+            if entry_ctx != ctx:
+                continue
+            score = sum(a * b for a, b in zip(emb, vec))
+            if score >= best_score:
+                best, best_score = text, score
+        return best
+
+    def add(self, emb: list[float], ctx: str, text: str) -> None:
+        self.entries.append((emb, ctx, text))
@@ -19,6 +19,12 @@ Env:
   LMSTUDIO_KEEP_TURNS        (default: 8)
   LMSTUDIO_MAX_CONTEXT_CHARS (default: 12000)
   LMSTUDIO_SUMMARY_WORDS     (default: 120)
+  LMSTUDIO_KEEP_FIRST        (default: 1; earliest messages pinned verbatim, rounded up to whole exchanges)
+  LMSTUDIO_COMPRESS_RATIO    (default: 0.75; share of the middle folded per compression)
+  LMSTUDIO_SUMMARY_THRESHOLD (default: 0.8; turn-count compression waits until context reaches this share of MAX_CONTEXT_CHARS)
+  LMSTUDIO_COMPRESS_MODE     (default: summary; "mask" replaces old turns with a placeholder, no LLM call;
+                              "fused" folds old turns into the summary within the chat reply itself)
+  LMSTUDIO_MASK_KEEP         (default: 16; placeholders kept in mask mode, oldest dropped first)
 
   OPENAI_API_KEY             (required for /check)
   OAI_CHECK_MODEL            (default: gpt-5-mini)
@@ -27,9 +33,33 @@ Env:
 
 import os
 import sys
+import asyncio
+import re
+import json
+import hashlib
+import inspect
+import importlib.util
+from operator import itemgetter
+from dataclasses import dataclass, field
 from typing import List, Dict, Tuple, Optional, Any
 
-from openai import OpenAI
+import httpx
+from openai import OpenAI, AsyncOpenAI, BadRequestError, DefaultAsyncHttpxClient
+
+from termio import thread_input
+
+try:  # optional: faster (de)serialization of summaries
+    import orjson
+except ImportError:
+    orjson = None
+
+try:  # optional: libuv event loop, lower per-event overhead while streaming
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# uvloop.run() needs uvloop >= 0.18; older releases fall back to asyncio.run
+_run_loop = getattr(uvloop, "run", None) or asyncio.run
 
 # --- Config (env overridable) ---
 BASE_URL             = os.environ.get("LMSTUDIO_BASE_URL", "http://127.0.0.1:11435/v1")
@@ -38,9 +68,16 @@ API_KEY              = os.environ.get("LMSTUDIO_API_KEY", "not-needed")  # requi
 KEEP_TURNS           = int(os.environ.get("LMSTUDIO_KEEP_TURNS", "8"))
 MAX_CONTEXT_CHARS    = int(os.environ.get("LMSTUDIO_MAX_CONTEXT_CHARS", "12000"))
 SUMMARY_TARGET_WORDS = int(os.environ.get("LMSTUDIO_SUMMARY_WORDS", "120"))
+KEEP_FIRST           = int(os.environ.get("LMSTUDIO_KEEP_FIRST", "1"))
+COMPRESS_RATIO       = float(os.environ.get("LMSTUDIO_COMPRESS_RATIO", "0.75"))
+SUMMARY_THRESHOLD    = float(os.environ.get("LMSTUDIO_SUMMARY_THRESHOLD", "0.8"))
+COMPRESS_MODE        = os.environ.get("LMSTUDIO_COMPRESS_MODE", "summary").lower()  # "summary", "mask" or "fused"
+MASK_KEEP            = int(os.environ.get("LMSTUDIO_MASK_KEEP", "16"))
 CHECK_MODEL          = os.environ.get("OAI_CHECK_MODEL", "gpt-5-mini")
 CHECK_DEBUG          = os.environ.get("OAI_CHECK_DEBUG", "").lower() in ("1", "true", "yes")
 
+MASKED_CONTENT = "<MASKED: older turn>"
+
 BASE_SYSTEM = (
     "You are a concise, helpful assistant. Be direct, accurate, and pragmatic. "
     "Prefer clear steps and minimal fluff."
@@ -50,112 +87,472 @@ BASE_SYSTEM = (
 # Helpers for summaries/etc
 # =========================
 
+_get_content = itemgetter("content")
+
 def est_total_chars(msgs: List[Dict]) -> int:
-    return sum(len(m.get("content", "")) for m in msgs)
+    # map/itemgetter keeps the whole reduction in C; every message dict carries "content"
+    return sum(map(len, map(_get_content, msgs)))
 
-def build_summary_prompt(existing_summary: str, transcript_chunk: List[Dict]) -> List[Dict]:
+@dataclass
+class ContextState:
+    """
+    Session history plus a running character count, so the compression
+    budget check is O(1) instead of re-summing every message each turn.
+    Also keeps the outbound list ([base] + [summary] + messages) in step with
+    appends, so a normal turn sends it without rebuilding it.
+    """
+    base_system_msg: Dict
+    summary_system_msg: Optional[Dict] = None
+    messages: List[Dict] = field(default_factory=list)
+    total_chars: int = 0  # sum of len(content) over messages
+    _outbound: List[Dict] = field(default_factory=list, repr=False)
+    _outbound_stale: bool = field(default=True, repr=False)
+
+    @property
+    def base_chars(self) -> int:
+        return len(self.base_system_msg.get("content", ""))
+
+    @property
+    def summary_chars(self) -> int:
+        return len(self.summary_system_msg.get("content", "")) if self.summary_system_msg else 0
+
+    @property
+    def context_chars(self) -> int:
+        return self.total_chars + self.base_chars + self.summary_chars
+
+    def over_budget(self) -> bool:
+        # Many short turns alone don't justify a summarizer round-trip: the turn-count
+        # limit only applies once the context is near the character budget.
+        chars = self.context_chars
+        if chars > MAX_CONTEXT_CHARS:
+            return True
+        return len(self.messages) > KEEP_TURNS * 2 + 2 and chars >= SUMMARY_THRESHOLD * MAX_CONTEXT_CHARS
+
+    @property
+    def summary_text(self) -> str:
+        return self.summary_system_msg.get("content", "") if self.summary_system_msg else ""
+
+    def outbound(self) -> List[Dict]:
+        """Messages to send; rebuilt only after history or the summary slot changed."""
+        if self._outbound_stale:
+            self._outbound = [self.base_system_msg] + ([self.summary_system_msg] if self.summary_system_msg else []) + self.messages
+            self._outbound_stale = False
+        return self._outbound
+
+    def append(self, msg: Dict) -> None:
+        self.messages.append(msg)
+        self.total_chars += len(msg.get("content", ""))
+        if not self._outbound_stale:
+            self._outbound.append(msg)
+
+    def set_messages(self, msgs: List[Dict]) -> None:
+        self.messages = msgs
+        self.total_chars = est_total_chars(msgs)
+        self._outbound_stale = True
+
+    def set_summary(self, content: str) -> None:
+        # Content is edited in place; only creating the message changes the outbound layout
+        if not self.summary_system_msg:
+            self.summary_system_msg = {"role": "system", "content": ""}
+            self._outbound_stale = True
+        self.summary_system_msg["content"] = content
+
+    def clear(self) -> None:
+        self.messages = []
+        self.total_chars = 0
+        self.summary_system_msg = None
+        self._outbound_stale = True
+
+# Structured summary: fixed fields, merged client-side so unchanged fields are never
+# re-summarized. goals/facts/decisions are append-only; open items are restated each round.
+SUMMARY_FIELDS = ("goals", "facts", "decisions", "open_questions", "next_steps")
+_OPEN_FIELDS = ("open_questions", "next_steps")
+_SUMMARY_MAX_ITEMS = 12  # per field, most recent kept
+SUMMARY_PREFIX = "[Dialogue Summary]\n"
+
+SUMMARY_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "dialogue_summary",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {f: {"type": "array", "items": {"type": "string"}} for f in SUMMARY_FIELDS},
+            "required": list(SUMMARY_FIELDS),
+            "additionalProperties": False,
+        },
+    },
+}
+
+# Summarizer instructions never change within a run; built once and shared (read-only).
+_SUMMARY_SYS_MSG = {
+    "role": "system",
+    "content": (
+        "You are a compression assistant. Given the currently open items of a chat summary and a new "
+        "transcript chunk, return a JSON object with these array-of-string fields:\n"
+        "- goals: NEW user goals, constraints, preferences from the chunk\n"
+        "- facts: NEW key facts/definitions/IDs/examples from the chunk\n"
+        "- decisions: NEW decisions made and rationale from the chunk\n"
+        "- open_questions: the FULL updated list (keep unresolved, drop resolved, add new)\n"
+        "- next_steps: the FULL updated list (keep pending, drop done, add new)\n\n"
+        f"Short phrases, ~{SUMMARY_TARGET_WORDS} words total. "
+        "No pleasantries, no filler, avoid repetition, keep technical detail that affects answers. "
+        "Do NOT include code unless essential."
+    ),
+}
+
+def _json_dumps(obj: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+def _json_loads(body: str) -> Any:
+    # orjson.JSONDecodeError subclasses ValueError, like json's
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+def parse_summary(content: str) -> Dict[str, List[str]]:
+    """Parse stored summary content (or a summarizer reply) into the fixed fields."""
+    body = content[len(SUMMARY_PREFIX):] if content.startswith(SUMMARY_PREFIX) else content
+    body = body.strip()
+    try:
+        data = _json_loads(body) if body else {}
+    except ValueError:
+        # Without a schema (fused replies, the no-response_format fallback) models
+        # often wrap the object in ```json fences or a line of prose: use the
+        # outermost {...} if there is one
+        start, end = body.find("{"), body.rfind("}")
+        try:
+            data = _json_loads(body[start:end + 1]) if 0 <= start < end else None
+        except ValueError:
+            data = None
+        if data is None:
+            data = {"facts": [body]}  # free-text reply; keep it rather than lose it
+    if not isinstance(data, dict):
+        data = {}
+    out: Dict[str, List[str]] = {}
+    for f in SUMMARY_FIELDS:
+        items = data.get(f)
+        out[f] = [str(x).strip() for x in items if str(x).strip()] if isinstance(items, list) else []
+    return out
+
+def merge_summary(existing: Dict[str, List[str]], update: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    merged: Dict[str, List[str]] = {}
+    for f in SUMMARY_FIELDS:
+        if f in _OPEN_FIELDS:
+            items = update[f]
+        else:
+            seen = set(existing[f])
+            items = existing[f] + [x for x in update[f] if x not in seen]
+        merged[f] = items[-_SUMMARY_MAX_ITEMS:]
+    return merged
+
+def format_summary(summary: Dict[str, List[str]]) -> str:
+    return SUMMARY_PREFIX + _json_dumps(summary)
+
+def transcript_text(transcript_chunk: List[Dict]) -> str:
     # Turn transcript chunk into a simple plain-text log
-    lines = []
-    for m in transcript_chunk:
-        role = m.get("role", "user")
-        content = m.get("content", "").strip()
-        if not content:
-            continue
-        lines.append(f"{role.upper()}: {content}")
-    chunk_text = "\n".join(lines)
+    return "\n".join(
+        f"{m.get('role', 'user').upper()}: {content}"
+        for m in transcript_chunk
+        if (content := m.get("content", "").strip())
+    )
 
-    sys_msg = {
-        "role": "system",
-        "content": (
-            "You are a compression assistant. Given a running chat summary and a new transcript chunk, "
-            "produce a *tight* updated summary that preserves:\n"
-            "- user goals, constraints, preferences\n"
-            "- key facts/definitions/IDs/examples\n"
-            "- decisions made and rationale\n"
-            "- open questions / next steps\n\n"
-            f"Limit to ~{SUMMARY_TARGET_WORDS} words, bullet-like prose if helpful. "
-            "No pleasantries, no filler, avoid repetition, keep technical detail that affects answers. "
-            "Do NOT include code unless essential."
-        ),
-    }
+def open_items_text(existing_summary: str) -> str:
+    # Only the open items go back to the model; append-only fields are merged locally
+    if not existing_summary:
+        return "(none)"
+    existing = parse_summary(existing_summary)
+    return _json_dumps({f: existing[f] for f in _OPEN_FIELDS})
+
+def build_summary_prompt(existing_summary: str, transcript_chunk: List[Dict]) -> List[Dict]:
+    chunk_text = transcript_text(transcript_chunk)
+    open_items = open_items_text(existing_summary)
+
+    # Single join over the parts; chunk_text can be many KB
     user_msg = {
         "role": "user",
-        "content": (
-            f"CURRENT SUMMARY (may be empty):\n{existing_summary or '(none)'}\n\n"
-            f"NEW TRANSCRIPT CHUNK:\n{chunk_text}\n\n"
-            "Return only the UPDATED SUMMARY."
-        ),
+        "content": "".join((
+            "OPEN ITEMS (may be empty):\n", open_items,
+            "\n\nNEW TRANSCRIPT CHUNK:\n", chunk_text,
+            "\n\nReturn only the JSON object.",
+        )),
     }
-    return [sys_msg, user_msg]
+    return [_SUMMARY_SYS_MSG, user_msg]
+
+# In-process summarizer cache: sha256(model | prompt) -> parsed summarizer reply (FIFO-bounded)
+_SUMMARY_CACHE: Dict[bytes, Dict[str, List[str]]] = {}
+_SUMMARY_CACHE_MAX = 32
+
+def _summary_cache_put(key: bytes, update: Dict[str, List[str]]) -> None:
+    _SUMMARY_CACHE[key] = update
+    while len(_SUMMARY_CACHE) > _SUMMARY_CACHE_MAX:
+        del _SUMMARY_CACHE[next(iter(_SUMMARY_CACHE))]
 
-def summarize_now(client: OpenAI, model: str, summary_system_msg: Dict, messages: List[Dict]) -> Dict:
+def _summary_key(model: str, smsgs: List[Dict]) -> bytes:
+    return hashlib.sha256(f"{model}|{smsgs[1]['content']}".encode()).digest()
+
+async def run_summarizer(client: AsyncOpenAI, model: str, existing_summary: str, transcript_chunk: List[Dict]) -> str:
+    """
+    Return updated "[Dialogue Summary]" content for existing_summary + transcript_chunk.
+    Identical requests (and re-summarizing a chunk onto its own summary) are served
+    from _SUMMARY_CACHE without a network call. Raises on API errors.
+    """
+    existing = parse_summary(existing_summary)
+    smsgs = build_summary_prompt(existing_summary, transcript_chunk)
+    key = _summary_key(model, smsgs)
+    update = _SUMMARY_CACHE.get(key)
+    if update is None:
+        try:
+            sresp = await client.chat.completions.create(
+                model=model, messages=smsgs, response_format=SUMMARY_RESPONSE_FORMAT
+            )
+        except BadRequestError:
+            # Server without structured-output support; the prompt still asks for JSON
+            sresp = await client.chat.completions.create(model=model, messages=smsgs)
+        update = parse_summary((sresp.choices[0].message.content or "").strip())
+        _summary_cache_put(key, update)
+
+    content = format_summary(merge_summary(existing, update))
+    # Folding the same chunk into the summary it just produced is a no-op
+    _summary_cache_put(_summary_key(model, build_summary_prompt(content, transcript_chunk)), update)
+    return content
+
+async def summarize_now(client: AsyncOpenAI, model: str, summary_system_msg: Dict, messages: List[Dict]) -> Dict:
     """Force-create/update the compressed summary from all user/assistant turns so far."""
     existing = summary_system_msg.get("content", "") if summary_system_msg else ""
     convo = [m for m in messages if m.get("role") in ("user", "assistant")]
     if not convo and not existing:
         return summary_system_msg  # nothing to summarize
-    smsgs = build_summary_prompt(existing, convo)
     try:
-        sresp = client.chat.completions.create(model=model, messages=smsgs)
-        updated = (sresp.choices[0].message.content or "").strip()
+        content = await run_summarizer(client, model, existing, convo)
         if not summary_system_msg:
             summary_system_msg = {"role": "system", "content": ""}
-        summary_system_msg["content"] = f"[Dialogue Summary]\n{updated}"
+        summary_system_msg["content"] = content
     except Exception as e:
         print(f"[summarize error: {e}]")
     return summary_system_msg
 
-def compress_if_needed(
-    client: OpenAI,
-    model: str,
-    base_system_msg: Dict,
-    summary_system_msg: Dict,
-    messages: List[Dict],
-) -> Tuple[Dict, Dict, List[Dict], str]:
+def split_history(messages: List[Dict]) -> Tuple[List[Dict], ...]:
+    """
+    Split history for compression into
+    (others, pinned, masked, head, kept_middle, tail):
+    pinned head | already-masked | head to fold | unfolded middle | recent KEEP_TURNS*2 tail.
+    "others" are any non user/assistant messages, kept as-is.
+    History alternates user/assistant starting with a user turn, so every
+    boundary falls on an even offset: the rebuilt list keeps that alternation
+    and never separates a question from its answer.
+    """
+    others = [m for m in messages if m.get("role") not in ("user", "assistant")]
+    non_system = [m for m in messages if m.get("role") in ("user", "assistant")]
+    pin_n = KEEP_FIRST + KEEP_FIRST % 2 if KEEP_FIRST > 0 else 0
+    pinned = non_system[:pin_n]
+    rest = non_system[len(pinned):]
+    tail_start = max(0, len(rest) - KEEP_TURNS * 2) if KEEP_TURNS > 0 else len(rest)
+    tail_start -= tail_start % 2
+    middle, tail = rest[:tail_start], rest[tail_start:]
+    # Already-masked messages lead the middle; never fold them again
+    done = 0
+    while done < len(middle) and middle[done].get("content") == MASKED_CONTENT:
+        done += 1
+    done -= done % 2
+    masked, middle = middle[:done], middle[done:]
+    fold_n = max(2, int(COMPRESS_RATIO * len(middle)) // 2 * 2) if middle else 0
+    return others, pinned, masked, middle[:fold_n], middle[fold_n:], tail
+
+async def compress_if_needed(client: AsyncOpenAI, model: str, state: ContextState) -> str:
     """
     If total context is large, fold older turns into the summary system message.
-    Returns possibly updated (base_system_msg, summary_system_msg, messages, summary_text).
+    History is split into a pinned head (first KEEP_FIRST messages, rounded up to
+    whole exchanges, kept verbatim), a compressible middle and the recent tail
+    (KEEP_TURNS*2 messages). Only the oldest COMPRESS_RATIO share of the middle,
+    in whole exchanges, is folded into the running summary.
+    With COMPRESS_MODE=mask the folded messages are instead replaced by a placeholder
+    (roles kept, at most MASK_KEEP of them) and no summarizer call is made.
+    Updates state in place and returns the current summary text.
     """
-    total_chars = est_total_chars([base_system_msg] + ([summary_system_msg] if summary_system_msg else []) + messages)
-    if total_chars <= MAX_CONTEXT_CHARS and len(messages) <= KEEP_TURNS * 2 + 2:
+    if not state.over_budget():
         # No compression needed
-        return base_system_msg, summary_system_msg, messages, (summary_system_msg.get("content", "") if summary_system_msg else "")
+        return state.summary_text
 
-    # Identify chunk to fold: everything except the most recent KEEP_TURNS*2 role msgs
-    non_system = [m for m in messages if m.get("role") in ("user", "assistant")]
-    tail = non_system[-KEEP_TURNS * 2 :] if KEEP_TURNS > 0 else []
-    head_len = len(non_system) - len(tail)
-    head = non_system[:head_len] if head_len > 0 else []
+    messages = state.messages
+    others, pinned, masked, head, kept_middle, tail = split_history(messages)
 
     if not head:
-        # Nothing to fold; still too big? Then trim tail conservatively.
-        trimmed = tail[-KEEP_TURNS * 2 :]
-        return base_system_msg, summary_system_msg, trimmed, (summary_system_msg.get("content", "") if summary_system_msg else "")
-
-    existing_summary = summary_system_msg.get("content", "") if summary_system_msg else ""
+        # Nothing to fold; still too big? Then trim tail conservatively
+        # (placeholders carry no content, so they go first).
+        state.set_messages(pinned + tail)
+        return state.summary_text
+
+    if COMPRESS_MODE == "mask":
+        # Observation masking: zero-cost, keeps turn structure without the content.
+        # Only the newest MASK_KEEP placeholders (whole exchanges) are kept, so
+        # the history stays bounded however long the session runs.
+        masked = masked + [{"role": m.get("role", "user"), "content": MASKED_CONTENT} for m in head]
+        cap = max(0, MASK_KEEP - MASK_KEEP % 2)
+        masked = masked[len(masked) - cap:] if len(masked) > cap else masked
+        state.set_messages(others + pinned + masked + kept_middle + tail)
+        return state.summary_text
+
+    existing_summary = state.summary_text
     # Ask model to update the summary
     try:
-        smsgs = build_summary_prompt(existing_summary, head)
-        sresp = client.chat.completions.create(model=model, messages=smsgs)
-        updated_summary = (sresp.choices[0].message.content or "").strip()
-        if not summary_system_msg:
-            summary_system_msg = {"role": "system", "content": ""}
-        summary_system_msg["content"] = f"[Dialogue Summary]\n{updated_summary}"
+        content = await run_summarizer(client, model, existing_summary, head)
+        state.set_summary(content)
     except Exception:
         pass  # keep existing summary if update fails
 
-    # Rebuild working messages = recent tail only (plus any non user/assistant messages if present)
+    # Rebuild working messages = pinned head + unfolded middle + recent tail
+    # (plus any non user/assistant messages if present). Folded messages are
+    # dropped, so the summary only ever accumulates each turn once.
     new_messages = []
-    others = [m for m in messages if m.get("role") not in ("user", "assistant")]
     new_messages.extend(others)
+    new_messages.extend(pinned)
+    new_messages.extend(masked)
+    new_messages.extend(kept_middle)
     new_messages.extend(tail)
+    state.set_messages(new_messages)
+
+    return state.summary_text
 
-    return base_system_msg, summary_system_msg, new_messages, summary_system_msg.get("content", "") if summary_system_msg else ""
+# ---- fused mode: fold the summary into the chat reply (one round-trip, not two) ----
+
+_FUSED_FORMAT = (
+    "\n\nReply EXACTLY in this form:\n"
+    "<SUMMARY>the JSON object</SUMMARY>\n"
+    "<ANSWER>your reply to the latest user message</ANSWER>"
+)
+_FUSED_RE = re.compile(r"<SUMMARY>(.*?)</SUMMARY>\s*<ANSWER>(.*?)(?:</ANSWER>|$)", re.S)
+
+def build_fused_turn(state: ContextState) -> Optional[Tuple[List[Dict], List[Dict]]]:
+    """
+    For COMPRESS_MODE=fused: build one request that both folds the oldest turns into
+    the summary and answers the pending user message.
+    Returns (outbound, kept_messages), or None when there is nothing to fold.
+    """
+    others, pinned, masked, head, kept_middle, tail = split_history(state.messages)
+    if not head:
+        return None
+    fold_msg = {
+        "role": "system",
+        "content": "".join((
+            "Before answering, fold the OLDER TRANSCRIPT below into the dialogue summary.\n",
+            _SUMMARY_SYS_MSG["content"],
+            "\n\nOPEN ITEMS (may be empty):\n", open_items_text(state.summary_text),
+            "\n\nOLDER TRANSCRIPT:\n", transcript_text(head),
+            _FUSED_FORMAT,
+        )),
+    }
+    kept = others + pinned + masked + kept_middle + tail
+    outbound = [state.base_system_msg] + ([state.summary_system_msg] if state.summary_system_msg else []) + [fold_msg] + kept
+    return outbound, kept
+
+def apply_fused_reply(state: ContextState, kept: List[Dict], raw: str) -> Optional[str]:
+    """
+    Split a fused reply into summary + answer and apply the summary to state.
+    Returns the answer, or None if the model ignored the format (state untouched).
+    """
+    m = _FUSED_RE.search(raw)
+    if not m:
+        return None
+    update = parse_summary(m.group(1))
+    state.set_summary(format_summary(merge_summary(parse_summary(state.summary_text), update)))
+    state.set_messages(kept)
+    return m.group(2).strip()
+
+class AnswerFilter:
+    """Pass through only the <ANSWER>...</ANSWER> part of a fused reply while it streams."""
+    OPEN, CLOSE = "<ANSWER>", "</ANSWER>"
+
+    def __init__(self) -> None:
+        self.buf = ""
+        self.started = False
+        self.closed = False
+        self.emitted = False
+
+    def _emit(self, out: str) -> str:
+        if not self.emitted:
+            out = out.lstrip()
+            self.emitted = bool(out)
+        return out
+
+    def feed(self, delta: str) -> str:
+        if self.closed:
+            return ""
+        self.buf += delta
+        if not self.started:
+            i = self.buf.find(self.OPEN)
+            if i < 0:
+                return ""
+            self.buf = self.buf[i + len(self.OPEN):]
+            self.started = True
+        j = self.buf.find(self.CLOSE)
+        if j >= 0:
+            out, self.buf, self.closed = self.buf[:j], "", True
+            return self._emit(out)
+        # Hold back what could be the start of a split closing tag
+        cut = max(0, len(self.buf) - (len(self.CLOSE) - 1))
+        out, self.buf = self.buf[:cut], self.buf[cut:]
+        return self._emit(out)
+
+    def flush(self) -> Optional[str]:
+        """Remaining answer text, or None if no <ANSWER> section was seen."""
+        if not self.started:
+            return None
+        out, self.buf = self.buf, ""
+        return self._emit(out)
+
+def last_exchange(messages: List[Dict]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Find the last assistant reply and its preceding user prompt.
+    History is interleaved, so this normally touches only the last two messages.
+    """
+    i = len(messages) - 1
+    while i >= 0 and messages[i].get("role") != "assistant":
+        i -= 1
+    if i < 0:
+        return None, None
+    j = i - 1
+    while j >= 0 and messages[j].get("role") != "user":
+        j -= 1
+    return (messages[j].get("content") if j >= 0 else None), messages[i].get("content")
 
 # ==========================================
 # /check — Responses API (like your oai.py)
 # ==========================================
 
+# One OpenAI client for /check, created on first use so its connection pool
+# (and keep-alive TLS connection) is reused by later checks.
+_OAI_CHECK_CLIENT: Optional[OpenAI] = None
+
+def _get_check_client() -> OpenAI:
+    global _OAI_CHECK_CLIENT
+    if _OAI_CHECK_CLIENT is None:
+        _OAI_CHECK_CLIENT = OpenAI()
+    return _OAI_CHECK_CLIENT
+
+# Kwargs always sent to responses.create; everything else is capability-probed
+_RESP_REQUIRED = frozenset(("model", "input", "tool_choice", "max_output_tokens"))
+_RESP_ACCEPTS: Optional[frozenset] = None
+
+# Constant text options for /check, shared across calls rather than rebuilt
+_CHECK_TEXT = {"verbosity": "low"}
+
+def _responses_accepts(oc: OpenAI) -> Optional[frozenset]:
+    """
+    Keyword names accepted by this SDK's responses.create, probed once per process.
+    None means "unknown / accepts **kwargs" — send everything.
+    """
+    global _RESP_ACCEPTS
+    if _RESP_ACCEPTS is None:
+        try:
+            params = inspect.signature(oc.responses.create).parameters
+        except (TypeError, ValueError):
+            return None
+        if any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params.values()):
+            return None
+        _RESP_ACCEPTS = frozenset(params)
+    return _RESP_ACCEPTS
+
 def _resp_to_dict(resp: Any) -> Dict:
     for attr in ("to_dict", "model_dump"):
         if hasattr(resp, attr):
@@ -165,36 +562,42 @@ def _resp_to_dict(resp: Any) -> Dict:
                 pass
     return {}
 
-def _extract_responses_text(resp: Any) -> Optional[str]:
-    """
-    Extract text from Responses API objects across shapes.
-    """
-    # Preferred modern path
-    txt = getattr(resp, "output_text", None)
-    if isinstance(txt, str) and txt.strip():
-        return txt.strip()
-
-    d = _resp_to_dict(resp) or {}
-    outputs = d.get("output") or d.get("outputs") or []
-    for item in outputs:
-        for part in item.get("content", []) or []:
-            t = part.get("text")
-            if isinstance(t, str) and t.strip():
-                return t.strip()
+def _iter_texts(d: Dict):
+    """Yield candidate text fields of a response dict, in preference order."""
+    for item in d.get("output") or d.get("outputs") or ():
+        for part in item.get("content") or ():
+            yield part.get("text")
             if part.get("type") == "message":
-                for mc in part.get("content", []) or []:
+                for mc in part.get("content") or ():
                     if mc.get("type") == "text":
-                        t2 = (mc.get("text") or "").strip()
-                        if t2:
-                            return t2
-
+                        yield mc.get("text")
     # Very old chat-like fallback
     choices = d.get("choices")
     if isinstance(choices, list) and choices:
-        msg = (((choices[0] or {}).get("message") or {}).get("content") or "")
-        if isinstance(msg, str) and msg.strip():
-            return msg.strip()
-    return None
+        yield ((choices[0] or {}).get("message") or {}).get("content")
+
+def _extract_responses_text(resp: Any) -> Optional[str]:
+    """Extract text from Responses API objects across shapes."""
+    # Preferred modern path: output_text is populated on current SDKs
+    txt = getattr(resp, "output_text", None)
+    if txt and isinstance(txt, str) and (txt := txt.strip()):
+        return txt
+    return _extract_responses_text_slow(resp)
+
+def _extract_responses_text_slow(resp: Any) -> Optional[str]:
+    """Fallbacks for responses without output_text (older SDKs, plain dicts)."""
+    # SDK objects: walk attributes directly, no model_dump() of the whole response
+    try:
+        for item in getattr(resp, "output", None) or ():
+            for part in getattr(item, "content", None) or ():
+                t = getattr(part, "text", None)
+                if isinstance(t, str) and t.strip():
+                    return t.strip()
+    except TypeError:
+        pass
+
+    d = resp if isinstance(resp, dict) else _resp_to_dict(resp) or {}
+    return next((t.strip() for t in _iter_texts(d) if isinstance(t, str) and t.strip()), None)
 
 def check_accuracy(last_user: str, last_assistant: str) -> None:
     """
@@ -210,11 +613,7 @@ def check_accuracy(last_user: str, last_assistant: str) -> None:
       OAI_CHECK_REASONING_CAP     integer cap (default 64)
       OAI_CHECK_DEBUG             1/true/yes for raw dumps on parse miss
     """
-    import os
-    from typing import Any, Dict, Optional
-    from openai import OpenAI
-
-    oc = OpenAI()
+    oc = _get_check_client()
     model_name = os.environ.get("OAI_CHECK_MODEL", "gpt-5-mini")
     debug = os.environ.get("OAI_CHECK_DEBUG", "").lower() in ("1", "true", "yes")
 
@@ -238,87 +637,49 @@ def check_accuracy(last_user: str, last_assistant: str) -> None:
     )
     user_block = f"USER PROMPT:\n{last_user}\n\nASSISTANT REPLY:\n{last_assistant}\n\nWas it accurate?"
 
-    # ---- tiny local fallbacks if your file doesn't already define these helpers ----
-    def _to_dict(obj: Any) -> Dict:
-        for attr in ("to_dict", "model_dump", "dict"):
-            if hasattr(obj, attr):
-                try:
-                    return getattr(obj, attr)()
-                except Exception:
-                    pass
-        return getattr(obj, "__dict__", {}) or {}
-
-    def _extract_responses_text_local(resp: Any) -> Optional[str]:
-        txt = getattr(resp, "output_text", None)
-        if isinstance(txt, str) and txt.strip():
-            return txt.strip()
-        d = _to_dict(resp) or {}
-        outputs = d.get("output") or d.get("outputs") or []
-        for item in outputs:
-            for part in item.get("content", []) or []:
-                t = part.get("text")
-                if isinstance(t, str) and t.strip():
-                    return t.strip()
-                if part.get("type") == "message":
-                    for mc in part.get("content", []) or []:
-                        if mc.get("type") == "text":
-                            t2 = (mc.get("text") or "").strip()
-                            if t2:
-                                return t2
-        ch = d.get("choices")
-        if isinstance(ch, list) and ch:
-            msg = (((ch[0] or {}).get("message") or {}).get("content") or "")
-            if isinstance(msg, str) and msg.strip():
-                return msg.strip()
-        return None
+    # Include both large output and reasoning cap; only max_output_tokens
+    # changes between attempts, so build (and filter) the rest once.
+    kwargs = dict(
+        model=model_name,
+        input=[
+            {"role": "system", "content": sys_prompt},
+            {"role": "user", "content": user_block},
+        ],
+        tool_choice="none",
+        max_reasoning_tokens=reasoning_cap,   # <- cap the hidden chain
+        text=_CHECK_TEXT,                     # helpful when supported
+    )
 
-    _extract_responses_text_fn = globals().get("_extract_responses_text", _extract_responses_text_local)
+    # Some SDKs reject optional params; drop the ones this SDK doesn't know
+    accepts = _responses_accepts(oc)
+    if accepts is not None:
+        kwargs = {k: v for k, v in kwargs.items() if k in accepts or k in _RESP_REQUIRED}
 
     # -------------------- main loop: escalate budgets --------------------
     for max_out in budgets:
         try:
-            # Primary attempt: include both large output and reasoning cap
-            kwargs = dict(
-                model=model_name,
-                input=[
-                    {"role": "system", "content": sys_prompt},
-                    {"role": "user", "content": user_block},
-                ],
-                tool_choice="none",
-                max_output_tokens=max_out,
-                max_reasoning_tokens=reasoning_cap,   # <- cap the hidden chain
-                text={"verbosity": "low"},            # helpful when supported
-            )
+            kwargs["max_output_tokens"] = max_out
+            resp = oc.responses.create(**kwargs)
 
-            # Some SDKs/models may reject optional params; strip and retry in order
-            try:
-                resp = oc.responses.create(**kwargs)
-            except TypeError:
-                # remove 'text'
-                kwargs2 = dict(kwargs)
-                kwargs2.pop("text", None)
-                try:
-                    resp = oc.responses.create(**kwargs2)
-                except TypeError:
-                    # remove reasoning cap too
-                    kwargs3 = dict(kwargs2)
-                    kwargs3.pop("max_reasoning_tokens", None)
-                    resp = oc.responses.create(**kwargs3)
-
-            d = _to_dict(resp) or {}
-            out = _extract_responses_text_fn(resp) or ""
+            out = _extract_responses_text(resp) or ""
 
             if out.strip():
                 print(f"[Accuracy Check] {out}")
                 return
 
-            status = d.get("status")
-            reason = (d.get("incomplete_details") or {}).get("reason")
+            # Attribute access first; only dump to a dict for non-SDK shapes or debug output
+            d: Optional[Dict] = None
+            status = getattr(resp, "status", None)
+            reason = getattr(getattr(resp, "incomplete_details", None), "reason", None)
+            if status is None:
+                d = _resp_to_dict(resp) or {}
+                status = d.get("status")
+                reason = (d.get("incomplete_details") or {}).get("reason")
             if status == "incomplete" and reason == "max_output_tokens":
                 if debug:
                     from pprint import pprint
                     print(f"[/check debug] incomplete due to max_output_tokens at {max_out} (cap={reasoning_cap})")
-                    pprint(d)
+                    pprint(d if d is not None else _resp_to_dict(resp))
                 # escalate to next budget
                 continue
 
@@ -326,7 +687,7 @@ def check_accuracy(last_user: str, last_assistant: str) -> None:
             if debug:
                 from pprint import pprint
                 print("[/check debug] empty text (not incomplete); raw follows:")
-                pprint(d)
+                pprint(d if d is not None else _resp_to_dict(resp))
             break
 
         except Exception as e:
@@ -340,34 +701,225 @@ def check_accuracy(last_user: str, last_assistant: str) -> None:
 # Main LM Studio UI
 # ================
 
-def main():
+async def stream_reply(
+    client: AsyncOpenAI, model: str, outbound: List[Dict], answer_filter: Optional[AnswerFilter] = None
+) -> str:
+    """
+    Stream the chat reply, printing deltas as they arrive.
+    Falls back to a blocking request if the stream fails before any text is shown.
+    With answer_filter, only the <ANSWER> section is shown (fused mode).
+    Returns the full (stripped) reply text.
+    """
+    chunks: List[str] = []
+    sys.stdout.write("AI: ")
+    sys.stdout.flush()
+    try:
+        resp = await client.chat.completions.create(model=model, messages=outbound, stream=True)
+        async for chunk in resp:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                chunks.append(delta)
+                shown = answer_filter.feed(delta) if answer_filter else delta
+                if shown:
+                    sys.stdout.write(shown)
+                    sys.stdout.flush()
+    except Exception as e:
+        if chunks:
+            # Partial reply already on screen; keep what we have
+            print(f"\n[stream interrupted: {e}]")
+        else:
+            try:
+                resp = await client.chat.completions.create(model=model, messages=outbound)
+                reply = (resp.choices[0].message.content or "").strip()
+            except Exception as e2:
+                reply = f"[error from server: {e2}]"
+            shown = reply
+            if answer_filter:
+                part = answer_filter.feed(reply)
+                rest = answer_filter.flush()
+                shown = part + rest if rest is not None else reply
+            print(f"{shown}\n")
+            return reply
+
+    if answer_filter:
+        rest = answer_filter.flush()
+        # No <ANSWER> section seen: nothing was shown, so show the raw reply
+        sys.stdout.write(rest if rest is not None else "".join(chunks).strip())
+    print("\n")
+    return "".join(chunks).strip()
+
+class StdinLines:
+    """
+    Line reader on the stdin fd driven by loop.add_reader: no thread, no extra
+    dependencies. POSIX selector loops only; see ainput() for the fallback.
+    """
+
+    def __init__(self) -> None:
+        self.fd = sys.stdin.fileno()
+        self.buf = b""
+        self.eof = False
+
+    @staticmethod
+    def supported(loop: asyncio.AbstractEventLoop) -> bool:
+        try:
+            loop.add_reader(sys.stdin.fileno(), lambda: None)
+        except (NotImplementedError, OSError, ValueError):
+            return False  # e.g. Windows proactor loop, or stdin redirected from a regular file
+        loop.remove_reader(sys.stdin.fileno())
+        return True
+
+    async def readline(self) -> str:
+        loop = asyncio.get_running_loop()
+        while b"\n" not in self.buf and not self.eof:
+            ready = loop.create_future()
+            loop.add_reader(self.fd, lambda: ready.done() or ready.set_result(None))
+            try:
+                await ready
+            finally:
+                loop.remove_reader(self.fd)
+            data = os.read(self.fd, 65536)
+            if data:
+                self.buf += data
+            else:
+                self.eof = True
+        if b"\n" in self.buf:
+            line, _, self.buf = self.buf.partition(b"\n")
+        elif self.buf:
+            line, self.buf = self.buf, b""
+        else:
+            raise EOFError
+        return line.decode("utf-8", "replace")
+
+_stdin_lines: Optional[StdinLines] = None
+_stdin_probed = False
+
+async def ainput(prompt: str) -> str:
+    """
+    Await a line of input while the event loop keeps running background work
+    (e.g. summarization). Uses StdinLines where the loop can watch stdin,
+    otherwise input() on a daemon thread (daemon so Ctrl+C never waits on it).
+    """
+    global _stdin_lines, _stdin_probed
+    loop = asyncio.get_running_loop()
+    if not _stdin_probed:
+        _stdin_probed = True
+        if StdinLines.supported(loop):
+            _stdin_lines = StdinLines()
+    if _stdin_lines is not None:
+        sys.stdout.write(prompt)
+        sys.stdout.flush()
+        return await _stdin_lines.readline()
+
+    return await thread_input(prompt)
+
+def lmstudio_http_client() -> DefaultAsyncHttpxClient:
+    """
+    Pooled keep-alive transport for the LM Studio client so rapid REPL turns
+    reuse one connection. HTTP/2 is enabled when the optional h2 package is
+    installed (pip install "httpx[http2]").
+    """
+    return DefaultAsyncHttpxClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60),
+    )
+
+@dataclass
+class Session:
+    """What slash-command handlers may read or change."""
+    client: AsyncOpenAI
+    model: str
+    state: ContextState
+
+# Slash-command handlers: (session, arg) -> True to keep the REPL running, False to exit
+
+async def _cmd_quit(session: Session, arg: str) -> bool:
+    return False
+
+async def _cmd_help(session: Session, arg: str) -> bool:
+    print(
+        "Commands:\n"
+        "  /quit or /exit      Exit\n"
+        "  /reset              Clear history (keeps base system)\n"
+        "  /model <name>       Switch model\n"
+        "  /system <text>      Set/replace base system prompt\n"
+        "  /summary            Show current compressed summary\n"
+        "  /summarize          Force-create/update the compressed summary now\n"
+        "  /check              Verify last answer with OpenAI API (Responses)\n"
+        "  /help               Show this help\n"
+    )
+    return True
+
+async def _cmd_reset(session: Session, arg: str) -> bool:
+    session.state.clear()
+    print("[history cleared]")
+    return True
+
+async def _cmd_model(session: Session, arg: str) -> bool:
+    if arg:
+        session.model = arg
+        print(f"[model set to: {session.model}]")
+    else:
+        print(f"[current model: {session.model}]")
+    return True
+
+async def _cmd_system(session: Session, arg: str) -> bool:
+    if arg:
+        session.state.base_system_msg["content"] = arg
+        print("[base system prompt updated]")
+    else:
+        print("[usage] /system <text>")
+    return True
+
+async def _cmd_summary(session: Session, arg: str) -> bool:
+    print(session.state.summary_text or "[no summary yet]")
+    return True
+
+async def _cmd_summarize(session: Session, arg: str) -> bool:
+    state = session.state
+    summary_msg = await summarize_now(session.client, session.model, state.summary_system_msg, state.messages)
+    if summary_msg:
+        state.set_summary(summary_msg["content"])
+    print(state.summary_text or "[no summary yet]")
+    return True
+
+async def _cmd_check(session: Session, arg: str) -> bool:
+    last_user, last_assistant = last_exchange(session.state.messages)
+    if last_user and last_assistant:
+        # Blocking SDK call; keep the event loop (and background compression) running
+        await asyncio.to_thread(check_accuracy, last_user, last_assistant)
+    else:
+        print("[/check] No recent Q/A pair found.")
+    return True
+
+COMMANDS = {
+    "/quit": _cmd_quit,
+    "/exit": _cmd_quit,
+    "/help": _cmd_help,
+    "/reset": _cmd_reset,
+    "/model": _cmd_model,
+    "/system": _cmd_system,
+    "/summary": _cmd_summary,
+    "/summarize": _cmd_summarize,
+    "/check": _cmd_check,
+}
+
+async def amain():
     # LM Studio-compatible client
-    client = OpenAI(base_url=BASE_URL, api_key=API_KEY)
+    client = AsyncOpenAI(base_url=BASE_URL, api_key=API_KEY, http_client=lmstudio_http_client())
 
-    current_model = DEFAULT_MODEL
-    base_system_msg = {"role": "system", "content": BASE_SYSTEM}
-    summary_system_msg = None  # {"role": "system", "content": "[Dialogue Summary] ..."}
-    messages: List[Dict] = []
+    # summary_system_msg: {"role": "system", "content": "[Dialogue Summary] ..."} once created
+    state = ContextState(base_system_msg={"role": "system", "content": BASE_SYSTEM})
+    session = Session(client=client, model=DEFAULT_MODEL, state=state)
+    pending_compress: Optional[asyncio.Task] = None  # post-turn compression running while the user types
 
-    print(f"LM Studio Chat (model: {current_model}) — session memory enabled")
+    print(f"LM Studio Chat (model: {session.model}) — session memory enabled")
     print("Type /help for commands. Ctrl+C or /quit to exit.\n")
 
-    def show_help():
-        print(
-            "Commands:\n"
-            "  /quit or /exit      Exit\n"
-            "  /reset              Clear history (keeps base system)\n"
-            "  /model <name>       Switch model\n"
-            "  /system <text>      Set/replace base system prompt\n"
-            "  /summary            Show current compressed summary\n"
-            "  /summarize          Force-create/update the compressed summary now\n"
-            "  /check              Verify last answer with OpenAI API (Responses)\n"
-            "  /help               Show this help\n"
-        )
-
     while True:
         try:
-            user_input = input("\nYou: ").strip()
+            user_input = (await ainput("\nYou: ")).strip()
         except EOFError:
             print()
             break
@@ -378,91 +930,58 @@ def main():
         if not user_input:
             continue
 
+        # Collect the background compression before touching history again
+        if pending_compress is not None:
+            await pending_compress
+            pending_compress = None
+
         # Slash-commands
         if user_input.startswith("/"):
-            cmd, *rest = user_input.split(maxsplit=1)
-            arg = rest[0] if rest else ""
-
-            if cmd in ("/quit", "/exit"):
-                break
-            elif cmd == "/help":
-                show_help()
-                continue
-            elif cmd == "/reset":
-                messages = []
-                summary_system_msg = None
-                print("[history cleared]")
-                continue
-            elif cmd == "/model":
-                if arg:
-                    current_model = arg
-                    print(f"[model set to: {current_model}]")
-                else:
-                    print(f"[current model: {current_model}]")
-                continue
-            elif cmd == "/system":
-                if arg:
-                    base_system_msg["content"] = arg
-                    print("[base system prompt updated]")
-                else:
-                    print("[usage] /system <text>")
-                continue
-            elif cmd == "/summary":
-                if summary_system_msg and summary_system_msg.get("content"):
-                    print(summary_system_msg["content"])
-                else:
-                    print("[no summary yet]")
-                continue
-            elif cmd == "/summarize":
-                summary_system_msg = summarize_now(client, current_model, summary_system_msg, messages)
-                if summary_system_msg and summary_system_msg.get("content"):
-                    print(summary_system_msg["content"])
-                else:
-                    print("[no summary yet]")
-                continue
-            elif cmd == "/check":
-                # Find the last assistant reply and its preceding user prompt
-                last_user = None
-                last_assistant = None
-                for m in reversed(messages):
-                    if not last_assistant and m.get("role") == "assistant":
-                        last_assistant = m.get("content")
-                    elif last_assistant and m.get("role") == "user":
-                        last_user = m.get("content")
-                        break
-                if last_user and last_assistant:
-                    check_accuracy(last_user, last_assistant)
-                else:
-                    print("[/check] No recent Q/A pair found.")
-                continue
-            else:
+            cmd, _, arg = user_input.partition(" ")
+            arg = arg.strip()
+            handler = COMMANDS.get(cmd)
+            if handler is None:
                 print("[unknown command; /help]")
                 continue
+            if not await handler(session, arg):
+                break
+            continue
 
         # Normal chat turn (LM Studio)
-        messages.append({"role": "user", "content": user_input})
-
-        # Compress if needed before sending
-        base_system_msg, summary_system_msg, messages, _ = compress_if_needed(
-            client, current_model, base_system_msg, summary_system_msg, messages
-        )
+        state.append({"role": "user", "content": user_input})
+
+        fused = build_fused_turn(state) if COMPRESS_MODE == "fused" and state.over_budget() else None
+        if fused:
+            # Summary update rides along with this reply; no separate summarizer call
+            outbound, kept = fused
+            raw = await stream_reply(client, session.model, outbound, AnswerFilter())
+            reply = apply_fused_reply(state, kept, raw)
+            fused_ok = reply is not None
+            if not fused_ok:
+                reply = raw
+        else:
+            fused_ok = False
+            # Compress if needed before sending
+            await compress_if_needed(client, session.model, state)
+
+            reply = await stream_reply(client, session.model, state.outbound())
+        state.append({"role": "assistant", "content": reply})
+
+        # Optional: compress after each turn if we’ve grown too large.
+        # Runs in the background so the summarizer overlaps with the user typing.
+        # Fused mode folds on the next turn instead, unless the model ignored the format.
+        # over_budget() is O(1), so the common under-budget turn schedules nothing.
+        if state.over_budget() and (COMPRESS_MODE != "fused" or (fused and not fused_ok)):
+            pending_compress = asyncio.create_task(compress_if_needed(client, session.model, state))
+
+    if pending_compress is not None:
+        pending_compress.cancel()
 
-        try:
-            resp = client.chat.completions.create(
-                model=current_model,
-                messages=[base_system_msg] + ([summary_system_msg] if summary_system_msg else []) + messages,
-            )
-            reply = (resp.choices[0].message.content or "").strip()
-        except Exception as e:
-            reply = f"[error from server: {e}]"
-
-        print(f"AI: {reply}\n")
-        messages.append({"role": "assistant", "content": reply})
-
-        # Optional: compress after each turn if we’ve grown too large
-        base_system_msg, summary_system_msg, messages, _ = compress_if_needed(
-            client, current_model, base_system_msg, summary_system_msg, messages
-        )
+def main():
+    try:
+        _run_loop(amain())
+    except KeyboardInterrupt:
+        print("\nExiting.")
 
 if __name__ == "__main__":
     main()
@@ -4,143 +4,760 @@ oai_reasoning.py — REPL for GPT-5 reasoning models (Responses API).
 Server-side conversation tracked via previous_response_id.
 
 Behavior:
-- REPL until /quit or Ctrl-C (one-shot if piped or --one-shot).
-- /reset clears server-side conversation.
+- REPL until /quit (or /exit, q) or Ctrl-C (one-shot if piped or --one-shot).
+- /reset (or /new) clears server-side conversation.
 - No "Assistant:" prefix; just raw outputs.
 """
 
-import os, sys, argparse
-from typing import Optional
-from openai import OpenAI
+import io, os, re, sys, time, json, random, sqlite3, asyncio, hashlib, argparse, functools
+import importlib.util
+from typing import Optional, Sequence
+import httpx
+from cache import SemanticCache, context_hash
+from termio import thread_input
+from openai import AsyncOpenAI, APIStatusError, RateLimitError, DefaultAsyncHttpxClient
+
+try:  # optional: faster cache-key serialization and SSE parsing
+    import orjson
+except ImportError:
+    orjson = None
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+try:  # optional: line editing and history at the REPL prompt
+    from prompt_toolkit import PromptSession
+except ImportError:
+    PromptSession = None
+
+try:  # optional: libuv event loop, lower per-event overhead while streaming
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# uvloop.run() needs uvloop >= 0.18; older releases fall back to asyncio.run
+_run_loop = getattr(uvloop, "run", None) or asyncio.run
 
 DEFAULT_MODEL = "gpt-5-mini"
 
-def call_reasoning(
-    client: OpenAI,
+# REPL command spellings, matched against the stripped, lowercased input.
+_QUIT = frozenset({"/quit", "/exit", "q", "exit", "quit"})
+_RESET = frozenset({"/reset", "/new"})
+_DEFAULT_BUDGETS = (800, 1600)
+_DEFAULT_BUDGETS_STR = ",".join(map(str, _DEFAULT_BUDGETS))
+
+# Streamed deltas are written out in small batches rather than one flush per
+# token: flush once this many bytes are pending, on a newline, or (on a
+# terminal) after this many seconds since the last write. Pipes and files
+# are coalesced into much larger writes.
+FLUSH_BYTES = 256
+FLUSH_INTERVAL = 0.03
+PIPE_FLUSH_BYTES = 16384
+
+# Fresh (no previous_response_id) requests are cached on disk so identical
+# replays -- dev loops, scripts piping the same prompt -- skip the API.
+# Entries expire after CACHE_TTL_SECONDS.
+CACHE_PATH = "~/.cache/oai-cli/responses.sqlite"
+CACHE_MAX_ROWS = 500
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# In-memory exact-match cache: (model, system, effort, prev_id, history, input)
+# -> (text, response_id), FIFO-bounded; checked before disk and semantic caches
+_EXACT_CACHE: dict[tuple, tuple[str, Optional[str]]] = {}
+_EXACT_CACHE_MAX = 256
+
+# --batch: seconds between status polls of a submitted Batch API job
+BATCH_POLL_SECONDS = 10
+
+# --keepalive: ping the API after this many idle seconds at the prompt, so
+# the pooled connection (keepalive_expiry=60) is still open for the next turn
+KEEPALIVE_SECONDS = 45
+
+# --speculative: prompts at least this long fire the first two budgets at once
+SPECULATIVE_MIN_CHARS = 2000
+
+
+@functools.lru_cache(maxsize=1)
+def _get_client() -> AsyncOpenAI:
+    """
+    One client (and connection pool) shared by the REPL and one-shot paths.
+    Keep-alive connections are reused across turns; HTTP/2 is enabled when
+    the optional h2 package is installed (pip install "httpx[http2]").
+    """
+    return AsyncOpenAI(http_client=DefaultAsyncHttpxClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=60),
+    ))
+
+
+@functools.lru_cache(maxsize=4)
+def _system_messages(system_prompt: str) -> tuple[dict, ...]:
+    """The system message for a session, built once; empty if no prompt is set."""
+    if not system_prompt:
+        return ()
+    return ({"role": "system", "content": system_prompt},)
+
+
+@functools.lru_cache(maxsize=None)
+def _reasoning(effort: str) -> dict:
+    """Shared reasoning options per effort level (one dict each, not per call)."""
+    return {"effort": effort}
+
+
+@functools.lru_cache(maxsize=None)
+def _cache_db(path: str) -> sqlite3.Connection:
+    """Open (once) the response cache, creating it on first use."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "key TEXT PRIMARY KEY, text TEXT, response_id TEXT, used REAL, created REAL)"
+    )
+    try:  # caches written before entries expired have no created column
+        conn.execute("ALTER TABLE responses ADD COLUMN created REAL")
+    except sqlite3.OperationalError:
+        pass
+    return conn
+
+
+def _dumps_sorted(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True).encode()
+
+
+def _disk_cached(path: str):
+    """
+    Cache call_reasoning results in sqlite, keyed on endpoint and account,
+    model, instructions, effort and input. Only fresh requests are cached (no
+    prev_id or history), and callers can opt out per call with cache=False.
+    Errors are never stored. A hit returns (text, None): the stored response
+    may be gone server-side by now, so it is never chained from.
+    """
+    path = os.path.expanduser(path)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*, cache: bool = True, **kwargs):
+            if not cache or kwargs.get("prev_id") or kwargs.get("history"):
+                return await fn(**kwargs)
+
+            client = kwargs["client"]
+            key = hashlib.blake2b(b"|".join([
+                str(client.base_url).encode(),
+                (client.api_key or "").encode(),
+                (client.organization or "").encode(),
+                (client.project or "").encode(),
+                kwargs["model"].encode(),
+                (kwargs["system_prompt"] or "").encode(),
+                kwargs["effort"].encode(),
+                _dumps_sorted(kwargs["user_input"]),
+            ])).hexdigest()
+
+            try:
+                conn = _cache_db(path)
+                row = conn.execute(
+                    "SELECT text FROM responses WHERE key = ? AND created > ?",
+                    (key, time.time() - CACHE_TTL_SECONDS),
+                ).fetchone()
+                if row:
+                    with conn:
+                        conn.execute("UPDATE responses SET used = ? WHERE key = ?",
+                                     (time.time(), key))
+                    if kwargs["stream"]:
+                        print(row[0].strip(), flush=True)
+                    return row[0], None
+            except (sqlite3.Error, OSError):   # e.g. ~/.cache unwritable: run uncached
+                return await fn(**kwargs)
+
+            text, new_id = await fn(**kwargs)
+            if new_id:
+                try:
+                    now = time.time()
+                    with conn:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                            (key, text, new_id, now, now),
+                        )
+                        conn.execute(
+                            "DELETE FROM responses WHERE key NOT IN ("
+                            "SELECT key FROM responses ORDER BY used DESC LIMIT ?)",
+                            (CACHE_MAX_ROWS,),
+                        )
+                except sqlite3.Error:
+                    pass
+            return text, new_id
+
+        return wrapper
+    return decorator
+
+
+def _exact_cached(fn):
+    """
+    Serve a literal repeat of a request (same model, system prompt, effort,
+    prev_id, client-side history and input) from _EXACT_CACHE without any
+    I/O. Unlike the disk cache this also covers chained turns. Honors
+    cache=False; errors are never stored.
+    """
+    @functools.wraps(fn)
+    async def wrapper(**kwargs):
+        if not kwargs.get("cache", True):
+            return await fn(**kwargs)
+
+        # History strings are reused turn to turn, so their hashes are cached
+        key = (
+            kwargs["model"], kwargs["system_prompt"], kwargs["effort"], kwargs.get("prev_id"),
+            tuple(m["content"] for m in kwargs.get("history") or ()), kwargs["user_input"],
+        )
+        hit = _EXACT_CACHE.get(key)
+        if hit is not None:
+            if kwargs["stream"]:
+                print(hit[0].strip(), flush=True)
+            return hit
+
+        text, new_id = await fn(**kwargs)
+        if new_id:
+            _EXACT_CACHE[key] = (text, new_id)
+            while len(_EXACT_CACHE) > _EXACT_CACHE_MAX:
+                del _EXACT_CACHE[next(iter(_EXACT_CACHE))]
+        return text, new_id
+
+    return wrapper
+
+
+def _semantic_cached(fn):
+    """
+    Answer near-duplicate queries from a per-session SemanticCache (passed
+    as semantic=...) when the conversation context is unchanged. A hit
+    returns (text, None), so the caller keeps its current prev_id.
+    Non-streamed requests start alongside the embedding and are cancelled
+    on a hit; streamed ones print as they go, so they wait for the lookup.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*, semantic: Optional[SemanticCache] = None, **kwargs):
+        if semantic is None:
+            return await fn(**kwargs)
+
+        ctx = context_hash(
+            kwargs["model"], kwargs["system_prompt"], kwargs["effort"],
+            kwargs.get("prev_id"), kwargs.get("history") or (),
+        )
+        call = None if kwargs["stream"] else asyncio.create_task(fn(**kwargs))
+        emb = await semantic.embed(kwargs["user_input"])
+        if emb is not None and (hit := semantic.lookup(emb, ctx)) is not None:
+            if call is not None:
+                call.cancel()
+            else:
+                print(hit.strip(), flush=True)
+            return hit, None
+
+        text, new_id = await (call if call is not None else fn(**kwargs))
+        if emb is not None and new_id:
+            semantic.add(emb, ctx, text)
+        return text, new_id
+
+    return wrapper
+
+
+def _backoff(exc: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before the next budget after a failed attempt:
+    exponential with jitter when the server is throttling (429) or
+    failing (5xx), zero for anything else.
+    """
+    if isinstance(exc, RateLimitError) or (
+        isinstance(exc, APIStatusError) and exc.status_code >= 500
+    ):
+        return random.uniform(0.5, 1.5) * (2 ** attempt)
+    return 0.0
+
+
+async def _create_once(client: AsyncOpenAI, kwargs: dict) -> tuple[str, Optional[str], bool]:
+    """One non-streaming attempt. Returns (raw_text, response_id, hit_max_output_tokens)."""
+    resp = await client.responses.create(**kwargs)
+
+    # Check if it stopped because of max tokens
+    status = getattr(resp, "status", None)
+    reason = getattr(getattr(resp, "incomplete_details", None), "reason", None)
+    truncated = status == "incomplete" and reason == "max_output_tokens"
+    return resp.output_text, resp.id, truncated
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    """os.write until everything is written (it may write only part)."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+class _FlushBuf:
+    """
+    Coalesces streamed deltas into few stdout writes. Terminals get raw
+    os.write() calls on the stdout fd (no TextIOWrapper encode/lock per
+    write) every FLUSH_BYTES or FLUSH_INTERVAL; pipes go through the binary
+    buffer in PIPE_FLUSH_BYTES chunks. A newline always flushes, and so does
+    the first write, so time-to-first-token is unchanged.
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.tty = sys.stdout.isatty()
+        self.fd = sys.stdout.fileno() if self.tty else None
+        self.limit = FLUSH_BYTES if self.tty else PIPE_FLUSH_BYTES
+        self.first_delta_written = False
+        self.last = time.monotonic()
+        sys.stdout.flush()     # anything printed earlier goes out first
+
+    def write(self, b: bytes) -> None:
+        self.buf += b
+        if (not self.first_delta_written or len(self.buf) >= self.limit or b"\n" in b
+                or (self.tty and time.monotonic() - self.last >= FLUSH_INTERVAL)):
+            self.first_delta_written = True
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buf:
+            if self.tty:
+                _write_all(self.fd, self.buf)
+            else:
+                sys.stdout.buffer.write(self.buf)
+                sys.stdout.buffer.flush()
+            self.buf.clear()
+        self.last = time.monotonic()
+
+
+async def _stream_once(client: AsyncOpenAI, kwargs: dict) -> tuple[str, Optional[str]]:
+    """
+    One streaming attempt, printing text as it arrives. Reads the raw SSE
+    lines over the client's pooled connection and dispatches on the event
+    type, skipping the SDK's per-event model objects.
+    Returns (raw_text, response_id).
+    """
+    buf = bytearray()          # full reply, decoded once at the end
+    out = _FlushBuf()
+    new_id = None
+
+    def on_delta(event: dict) -> None:
+        chunk = event["delta"].encode()
+        buf.extend(chunk)
+        out.write(chunk)
+
+    def on_completed(event: dict) -> None:
+        nonlocal new_id
+        new_id = event["response"]["id"]
+
+    def on_error(event: dict) -> None:
+        err = event.get("error") or (event.get("response") or {}).get("error") or event
+        raise RuntimeError(err.get("message") or event["type"])
+
+    handlers = {
+        "response.output_text.delta": on_delta,
+        "response.completed": on_completed,
+        "response.failed": on_error,
+        "error": on_error,
+    }
+
+    try:
+        async with client.responses.with_streaming_response.create(stream=True, **kwargs) as raw:
+            async for line in raw.iter_lines():
+                if not line.startswith("data: "):
+                    continue
+                event = _json_loads(line[6:])
+                handler = handlers.get(event.get("type"))
+                if handler is not None:
+                    handler(event)
+        out.write(b"\n")
+    finally:
+        out.flush()            # text received before an error still gets shown
+    return buf.decode("utf-8", "replace"), new_id
+
+
+@_exact_cached
+@_disk_cached(CACHE_PATH)
+@_semantic_cached
+async def call_reasoning(
+    client: AsyncOpenAI,
     model: str,
     user_input: str,
     system_prompt: str,
-    budgets: list[int],
+    budgets: tuple[int, ...],
     effort: str,
     prev_id: Optional[str],
     stream: bool,
+    speculative: bool = False,
+    history: Sequence[dict] = (),
 ) -> tuple[str, Optional[str]]:
     """
     Make a reasoning-model request (GPT-5 family) with token budget escalation.
     Tries each budget in order until a complete response is returned.
-    Returns (assistant_text, new_response_id).
+    With speculative (non-stream, long prompts), the first two budgets are
+    requested concurrently and the first complete answer wins.
+    history is a client-side transcript sent between the system message and
+    the new turn (used instead of prev_id).
+    Returns (assistant_text, new_response_id). The text is exactly what the
+    model produced (not stripped), so it can go back into a transcript
+    byte-for-byte; strip it for display.
     """
     last_error = None
+    user_msg = {"role": "user", "content": user_input}
+    input_msgs = [*_system_messages(system_prompt), *history, user_msg]
 
-    for max_out in budgets:
-        kwargs = dict(
-            model=model,
-            input=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_input},
-            ],
-            max_output_tokens=max_out,
-            reasoning={"effort": effort},
-        )
-        if prev_id:
-            kwargs["previous_response_id"] = prev_id
+    # Only max_output_tokens changes between attempts
+    kwargs = dict(model=model, input=input_msgs, reasoning=_reasoning(effort))
+    if prev_id:
+        kwargs["previous_response_id"] = prev_id
+
+    if (speculative and not stream and len(budgets) > 1
+            and len(user_input) >= SPECULATIVE_MIN_CHARS):
+        tasks = [
+            asyncio.create_task(_create_once(client, {**kwargs, "max_output_tokens": b}))
+            for b in budgets[:2]
+        ]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                try:
+                    text, new_id, truncated = await fut
+                except Exception as e:
+                    last_error = str(e)
+                    continue
+                if truncated:
+                    last_error = "max_output_tokens"
+                    continue
+                return text, new_id
+        finally:
+            for t in tasks:
+                t.cancel()  # the loser, if still in flight
+        budgets = budgets[2:]
 
+    # A streamed reply is already on screen when it runs out of budget, so it
+    # can't escalate: stream with the largest budget from the start (further
+    # attempts only happen after errors).
+    top_budget = max(budgets) if budgets else None
+
+    for attempt, max_out in enumerate(budgets):
+        kwargs["max_output_tokens"] = top_budget if stream else max_out
         try:
             if stream:
-                chunks: list[str] = []
-                new_id = None
-                with client.responses.stream(**kwargs) as stream_obj:
-                    for event in stream_obj:
-                        if event.type == "response.output_text.delta":
-                            print(event.delta, end="", flush=True)
-                            chunks.append(event.delta)
-                        elif event.type == "response.completed":
-                            new_id = event.response.id
-                    print("", flush=True)
-                return "".join(chunks).strip(), new_id
+                return await _stream_once(client, kwargs)
 
-            else:
-                resp = client.responses.create(**kwargs)
-                text = resp.output_text.strip()
-                new_id = resp.id
-
-                # Check if it stopped because of max tokens
-                data = resp.to_dict() if hasattr(resp, "to_dict") else {}
-                status = data.get("status")
-                reason = (data.get("incomplete_details") or {}).get("reason")
-                if status == "incomplete" and reason == "max_output_tokens":
-                    last_error = "max_output_tokens"
-                    continue  # try next budget
+            text, new_id, truncated = await _create_once(client, kwargs)
+            if truncated:
+                last_error = "max_output_tokens"
+                continue  # try next budget
 
-                return text, new_id
+            return text, new_id
 
         except Exception as e:
             last_error = str(e)
+            if attempt + 1 < len(budgets) and (delay := _backoff(e, attempt)):
+                await asyncio.sleep(delay)
             continue
 
     # If no attempt succeeded
     return (f"[Error: {last_error or 'no response'}]", None)
 
 
-def run_repl(args):
-    client = OpenAI()
+async def run_parallel(args, client: AsyncOpenAI, prompts: list[str]) -> list[str]:
+    """Answer independent prompts concurrently, at most args.parallel at a time."""
+    sem = asyncio.Semaphore(args.parallel)
+
+    async def one(prompt: str) -> str:
+        async with sem:
+            text, _ = await call_reasoning(
+                client=client,
+                model=args.model,
+                user_input=prompt,
+                system_prompt=args.system,
+                budgets=args.budgets,
+                effort=args.effort,
+                prev_id=None,
+                stream=False,
+                cache=args.cache,
+            )
+            return text.strip()
+
+    return await asyncio.gather(*(one(p) for p in prompts))
+
+
+def _batch_output_text(body: dict) -> str:
+    """Text of a raw Responses API body (batch output has no output_text helper)."""
+    parts = [
+        part.get("text", "")
+        for item in body.get("output") or ()
+        for part in item.get("content") or ()
+        if part.get("type") == "output_text"
+    ]
+    return "".join(parts).strip()
+
+
+async def run_batch(args, client: AsyncOpenAI, prompts: list[str]) -> list[str]:
+    """
+    Submit prompts as one Batch API job (half price, up to 24h latency),
+    wait for it, and return the answers in input order. Each request gets
+    the largest budget up front since a batch can't escalate.
+    """
+    lines = []
+    for i, prompt in enumerate(prompts):
+        body = dict(
+            model=args.model,
+            input=[*_system_messages(args.system), {"role": "user", "content": prompt}],
+            max_output_tokens=max(args.budgets),
+            reasoning=_reasoning(args.effort),
+        )
+        lines.append(json.dumps({
+            "custom_id": f"req-{i}", "method": "POST", "url": "/v1/responses", "body": body,
+        }))
+    payload = io.BytesIO(("\n".join(lines) + "\n").encode())
+
+    upload = await client.files.create(file=("batch.jsonl", payload), purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=upload.id, endpoint="/v1/responses", completion_window="24h",
+    )
+    print(f"(batch {batch.id} submitted: {len(prompts)} prompts)", file=sys.stderr)
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        await asyncio.sleep(BATCH_POLL_SECONDS)
+        batch = await client.batches.retrieve(batch.id)
+
+    results = [f"[Error: batch {batch.status}]"] * len(prompts)
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in (await client.files.content(file_id)).text.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            i = int(row["custom_id"].rpartition("-")[2])
+            resp = row.get("response") or {}
+            if row.get("error") or resp.get("status_code") != 200:
+                err = row.get("error") or (resp.get("body") or {}).get("error") or {}
+                results[i] = f"[Error: {err.get('message') or 'request failed'}]"
+            else:
+                results[i] = _batch_output_text(resp["body"])
+    return results
+
+
+def _trim_history(history: list[dict], max_turns: int) -> None:
+    """
+    Keep at most max_turns user/assistant pairs. The oldest pair after the
+    first is dropped, so the start of the transcript -- the prompt prefix the
+    server can cache -- stays the same for as long as possible.
+    """
+    while len(history) > 2 * max_turns:
+        if max_turns > 1:
+            del history[2:4]
+        else:
+            del history[:2]
+
+
+async def _keepalive(client: AsyncOpenAI, activity: asyncio.Event) -> None:
+    """
+    Background task for --keepalive: whenever KEEPALIVE_SECONDS pass without
+    a turn (activity set), send a cheap models.list() so the next request
+    doesn't pay for a fresh TCP/TLS handshake.
+    """
+    pinger = client.with_options(timeout=5, max_retries=0)
+    while True:
+        try:
+            await asyncio.wait_for(activity.wait(), KEEPALIVE_SECONDS)
+            activity.clear()
+            continue
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await pinger.models.list()
+        except Exception:
+            pass
+
+
+_prompt_session = None
+
+async def ainput(prompt: str) -> str:
+    """
+    Await a line of input while the event loop keeps running background
+    work (keepalive pings). Uses prompt_toolkit when installed, otherwise
+    input() on a daemon thread (daemon so Ctrl-C never waits on it).
+    """
+    global _prompt_session
+    if PromptSession is not None:
+        if _prompt_session is None:
+            _prompt_session = PromptSession()
+        return await _prompt_session.prompt_async(prompt)
+
+    return await thread_input(prompt)
+
+
+async def run_repl(args, client: AsyncOpenAI):
     prev_id = None
+    history: list[dict] = []   # only used with --client-history
+    semantic = SemanticCache(client) if args.semantic_cache else None
+
+    # Per-session settings, looked up once rather than on every turn
+    stream, client_history = args.stream, args.client_history
+    call_kwargs = dict(
+        client=client,
+        model=args.model,
+        system_prompt=args.system,
+        budgets=args.budgets,
+        effort=args.effort,
+        stream=stream,
+        speculative=args.speculative,
+        # Response caches serve one-shot/--parallel only: a cached answer has
+        # no response id to chain from, so the next turn would lose context
+        cache=False,
+        semantic=semantic,
+    )
+
+    # Command handlers return False to end the session
+    def _quit() -> bool:
+        return False
+
+    def _reset() -> bool:
+        nonlocal prev_id
+        prev_id = None
+        history.clear()
+        print("(conversation reset)")
+        return True
+
+    commands = {**dict.fromkeys(_QUIT, _quit), **dict.fromkeys(_RESET, _reset)}
+
+    activity = asyncio.Event()
+    pinger = asyncio.create_task(_keepalive(client, activity)) if args.keepalive else None
 
     print(f"oai reasoning REPL ({args.model}) started.")
-    print("Commands: /quit, /reset\n")
+    print("Commands: /quit (/exit, q), /reset (/new)\n")
 
     try:
         while True:
-            user = input("\nYou: ").strip()
+            user = (await ainput("\nYou: ")).strip()
             if not user:
                 continue
-            if user.lower() in ("/quit", "/exit"):
-                break
-            if user.lower() == "/reset":
-                prev_id = None
-                print("(conversation reset)")
+            handler = commands.get(user.lower())
+            if handler is not None:
+                if not handler():
+                    break
                 continue
 
-            text, new_id = call_reasoning(
-                client=client,
-                model=args.model,
+            text, new_id = await call_reasoning(
+                **call_kwargs,
                 user_input=user,
-                system_prompt=args.system,
-                budgets=args.budgets,     # ✅ fixed
-                effort=args.effort,
-                prev_id=prev_id,
-                stream=args.stream,
+                prev_id=None if client_history else prev_id,
+                history=history,
             )
-            if not args.stream:
-                print(text)
+            if not stream:
+                print(text.strip())
 
-            prev_id = new_id or prev_id
+            if client_history:
+                if not text.startswith("[Error:"):
+                    history.append({"role": "user", "content": user})
+                    history.append({"role": "assistant", "content": text})
+                    _trim_history(history, client_history)
+            else:
+                prev_id = new_id or prev_id
+            activity.set()
 
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, EOFError):
         print("\n(^C) exiting session")
+    finally:
+        if pinger is not None:
+            pinger.cancel()
+
+
+def _split_prompts(text: str, mode: str = "line") -> list[str]:
+    """
+    Independent prompts in piped input for --batch / --parallel, as chosen
+    by --split: one prompt per non-empty line ("line"), or one per
+    blank-line separated paragraph so a prompt may span several lines
+    ("paragraph").
+    """
+    if mode == "paragraph":
+        return [p.strip() for p in re.split(r"\n[ \t]*\n", text) if p.strip()]
+    return [ln.strip() for ln in text.splitlines() if ln.strip()]
+
+
+def _parse_budgets(spec: str) -> tuple[int, ...]:
+    """
+    argparse type for --budgets: comma-separated positive ints as an
+    immutable tuple (the default needs no parsing). Empty items are skipped;
+    anything else that isn't a positive integer is rejected up front.
+    """
+    if spec == _DEFAULT_BUDGETS_STR:
+        return _DEFAULT_BUDGETS
+    tokens = [t for t in (p.strip() for p in spec.split(",")) if t]
+    bad = [t for t in tokens if not t.isdigit() or int(t) == 0]
+    if bad:
+        raise argparse.ArgumentTypeError(f"invalid budget(s): {', '.join(bad)}")
+    return tuple(map(int, tokens)) or _DEFAULT_BUDGETS
+
+
+def _non_negative_int(spec: str) -> int:
+    """argparse type for counts where 0 means off (e.g. --client-history)."""
+    try:
+        n = int(spec)
+    except ValueError:
+        n = -1
+    if n < 0:
+        raise argparse.ArgumentTypeError(f"expected a non-negative integer, got {spec!r}")
+    return n
 
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("-m", "--model", default=DEFAULT_MODEL)
     ap.add_argument("--system", default="Answer directly and concisely.")
-    ap.add_argument("--budgets", default="800,1600",
+    ap.add_argument("--budgets", type=_parse_budgets, default=_DEFAULT_BUDGETS_STR,
                     help="Comma-separated list of max_output_tokens attempts")
     ap.add_argument("--effort", choices=["low","medium","high"], default="medium")
     ap.add_argument("--stream", action="store_true")
     ap.add_argument("--one-shot", action="store_true")
+    ap.add_argument("--no-cache", dest="cache", action="store_false",
+                    help="Always call the API; skip the on-disk response cache")
+    ap.add_argument("--client-history", type=_non_negative_int, default=0, metavar="N",
+                    help="REPL: resend the last N exchanges yourself instead of "
+                         "chaining previous_response_id (stable, cacheable prefix)")
+    ap.add_argument("--semantic-cache", action="store_true",
+                    help="REPL: answer near-duplicate questions (same context) from memory")
+    ap.add_argument("--keepalive", action="store_true",
+                    help="REPL: ping the API while idle so the connection stays warm")
+    ap.add_argument("--batch", action="store_true",
+                    help="Send the piped prompts (see --split) as one Batch API job (cheaper, slower)")
+    ap.add_argument("--speculative", action="store_true",
+                    help="For long prompts, request the first two budgets at once (non-stream)")
+    ap.add_argument("--parallel", type=int, default=1, metavar="N",
+                    help="Send the piped prompts (see --split) as separate requests, N at a time")
+    ap.add_argument("--split", choices=("line", "paragraph"), default="line",
+                    help="--batch/--parallel: one prompt per line (default) or per "
+                         "blank-line separated paragraph")
     args = ap.parse_args()
 
-    # Parse budgets into a list of ints
-    args.budgets = [int(x) for x in args.budgets.split(",") if x.strip().isdigit()] or [800, 1600]
+    try:
+        _run_loop(amain(args))
+    except KeyboardInterrupt:
+        print("\n(^C) exiting session")
+
+
+async def amain(args):
+    client = _get_client()
+    try:
+        await _run(args, client)
+    finally:
+        await client.close()
+
 
-    client = OpenAI()
+async def _run(args, client: AsyncOpenAI):
     if args.one_shot or not sys.stdin.isatty():
         prompt = sys.stdin.read().strip()
         if not prompt:
             print("No prompt provided.")
             sys.exit(1)
-        text, _ = call_reasoning(
+        prompts = _split_prompts(prompt, args.split)
+        if args.batch and len(prompts) > 1:
+            print("\n\n".join(await run_batch(args, client, prompts)))
+            return
+        if args.parallel > 1 and len(prompts) > 1:
+            # Independent prompts; answers printed in input order.
+            print("\n\n".join(await run_parallel(args, client, prompts)))
+            return
+        text, _ = await call_reasoning(
             client=client,
             model=args.model,
             user_input=prompt,
@@ -149,11 +766,13 @@ def main():
             effort=args.effort,
             prev_id=None,
             stream=args.stream,
+            speculative=args.speculative,
+            cache=args.cache,
         )
         if not args.stream:
-            print(text)
+            print(text.strip())
     else:
-        run_repl(args)
+        await run_repl(args, client)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,31 @@
+"""
+termio.py — terminal input helpers shared by oai.py and endpoint-oai.py.
+"""
+
+import asyncio
+import threading
+
+
+async def thread_input(prompt: str) -> str:
+    """
+    input() on a daemon thread, awaited without blocking the event loop
+    (daemon so Ctrl-C never waits on it). EOFError / KeyboardInterrupt from
+    input() are re-raised in the awaiting task.
+    """
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+
+    def _settle(setter, value):
+        if not fut.done():
+            setter(value)
+
+    def _reader():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(_settle, fut.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(_settle, fut.set_result, line)
+
+    threading.Thread(target=_reader, daemon=True).start()
+    return await fut
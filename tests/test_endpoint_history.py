@@ -0,0 +1,91 @@
+import asyncio
+import importlib.util
+import pathlib
+import unittest
+
+_PATH = pathlib.Path(__file__).resolve().parent.parent / "endpoint-oai.py"
+_spec = importlib.util.spec_from_file_location("endpoint_oai", _PATH)
+ep = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(ep)
+
+
+def convo(n, size=20):
+    """n alternating user/assistant messages, starting with the user."""
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"{i}:" + "x" * size}
+        for i in range(n)
+    ]
+
+
+def roles(msgs):
+    return [m["role"] for m in msgs]
+
+
+class SplitHistoryTest(unittest.TestCase):
+    def test_rebuilt_history_alternates_roles(self):
+        for n in range(1, 80):
+            with self.subTest(n=n):
+                others, pinned, masked, head, kept_middle, tail = ep.split_history(convo(n))
+                kept = pinned + masked + kept_middle + tail
+                expected = ["user", "assistant"] * n
+                self.assertEqual(roles(kept), expected[: len(kept)])
+                self.assertEqual(len(head) % 2, 0)
+
+    def test_first_exchange_pinned_together(self):
+        msgs = convo(30)
+        _, pinned, *_ = ep.split_history(msgs)
+        self.assertEqual(pinned, msgs[:2])
+
+
+class MaskModeTest(unittest.TestCase):
+    def setUp(self):
+        self._mode = ep.COMPRESS_MODE
+        ep.COMPRESS_MODE = "mask"
+
+    def tearDown(self):
+        ep.COMPRESS_MODE = self._mode
+
+    def test_context_stays_bounded(self):
+        state = ep.ContextState(base_system_msg={"role": "system", "content": ep.BASE_SYSTEM})
+
+        async def session():
+            for i in range(1500):
+                for role in ("user", "assistant"):
+                    state.append({"role": role, "content": f"{i}:" + "x" * 300})
+                    await ep.compress_if_needed(None, "m", state)
+                    self.assertFalse(state.over_budget())
+
+        asyncio.run(session())
+        n_masked = sum(m["content"] == ep.MASKED_CONTENT for m in state.messages)
+        self.assertLessEqual(n_masked, ep.MASK_KEEP)
+        self.assertLessEqual(state.context_chars, ep.MAX_CONTEXT_CHARS)
+        self.assertEqual(roles(state.messages), ["user", "assistant"] * (len(state.messages) // 2))
+
+class ParseSummaryTest(unittest.TestCase):
+    def test_fenced_json_is_parsed(self):
+        raw = 'Here you go:\n```json\n{"goals": ["g"], "facts": ["f"], "decisions": [], ' \
+              '"open_questions": ["q"], "next_steps": ["n"]}\n```'
+        self.assertEqual(ep.parse_summary(raw), {
+            "goals": ["g"], "facts": ["f"], "decisions": [],
+            "open_questions": ["q"], "next_steps": ["n"],
+        })
+
+    def test_fused_reply_with_fenced_summary_keeps_open_items(self):
+        state = ep.ContextState(base_system_msg={"role": "system", "content": ep.BASE_SYSTEM})
+        state.set_summary(ep.format_summary(ep.parse_summary('{"open_questions": ["old q"]}')))
+        raw = '<SUMMARY>```json\n{"facts": ["f1"], "open_questions": ["old q", "new q"]}\n```</SUMMARY>' \
+              '<ANSWER>hi</ANSWER>'
+        self.assertEqual(ep.apply_fused_reply(state, [], raw), "hi")
+        summary = ep.parse_summary(state.summary_text)
+        self.assertEqual(summary["facts"], ["f1"])
+        self.assertEqual(summary["open_questions"], ["old q", "new q"])
+
+
+class ExtractResponsesTextTest(unittest.TestCase):
+    def test_plain_dict(self):
+        resp = {"output": [{"content": [{"text": " hi "}]}]}
+        self.assertEqual(ep._extract_responses_text(resp), "hi")
+
+
+if __name__ == "__main__":
+    unittest.main()
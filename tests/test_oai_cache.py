@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+import httpx
+from openai import AsyncOpenAI
+
+_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+# CACHE_PATH is expanded when oai is imported, so HOME must point at a
+# scratch directory first.
+_HOME = tempfile.TemporaryDirectory()
+os.environ["HOME"] = _HOME.name
+import oai  # noqa: E402
+
+
+def fake_client(requests):
+    """AsyncOpenAI whose /responses endpoint records each body and answers 'ok'."""
+    def handler(request):
+        body = json.loads(request.content)
+        requests.append(body)
+        return httpx.Response(200, json={
+            "id": f"resp_{len(requests)}", "object": "response", "created_at": 0,
+            "status": "completed", "model": body["model"],
+            "output": [{"type": "message", "id": "m", "status": "completed", "role": "assistant",
+                        "content": [{"type": "output_text", "text": "ok", "annotations": []}]}],
+            "parallel_tool_calls": False, "tool_choice": "none", "tools": [],
+        })
+
+    return AsyncOpenAI(api_key="test", base_url="http://test/v1",
+                       http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+def repl_args(**overrides):
+    args = dict(
+        model="m", system="s", budgets=(100,), effort="low", stream=False,
+        speculative=False, cache=True, semantic_cache=False, client_history=0,
+        keepalive=False,
+    )
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+class ReplDiskCacheTest(unittest.TestCase):
+    def test_follow_up_after_cached_opening_keeps_context(self):
+        requests = []
+        client = fake_client(requests)
+        lines = iter(["hello", "follow up"])
+
+        async def scripted_input(prompt):
+            try:
+                return next(lines)
+            except StopIteration:
+                raise EOFError
+
+        async def session():
+            # A one-shot run of the same opening question fills the disk cache
+            await oai.call_reasoning(
+                client=client, model="m", user_input="hello", system_prompt="s",
+                budgets=(100,), effort="low", prev_id=None, stream=False,
+            )
+            oai._EXACT_CACHE.clear()
+            real_input, oai.ainput = oai.ainput, scripted_input
+            try:
+                await oai.run_repl(repl_args(), client)
+            finally:
+                oai.ainput = real_input
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(session())
+        self.assertEqual(len(requests), 3)
+        self.assertEqual(requests[2]["input"][-1]["content"], "follow up")
+        self.assertEqual(requests[2].get("previous_response_id"), "resp_2")
+
+    def test_unusable_cache_dir_falls_through(self):
+        requests = []
+        client = fake_client(requests)
+        blocker = pathlib.Path(_HOME.name) / "not-a-dir"
+        blocker.write_text("")
+        # call_reasoning minus its exact-match and disk layers, re-wrapped with
+        # a disk cache whose directory cannot be created
+        undecorated = oai.call_reasoning.__wrapped__.__wrapped__
+        call = oai._disk_cached(str(blocker / "cache" / "responses.sqlite"))(undecorated)
+
+        text, new_id = asyncio.run(call(
+            client=client, model="m", user_input="hi", system_prompt="s",
+            budgets=(100,), effort="low", prev_id=None, stream=False,
+        ))
+        self.assertEqual((text, new_id), ("ok", "resp_1"))
+
+
+if __name__ == "__main__":
+    unittest.main()